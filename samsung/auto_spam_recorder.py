@@ -1,20 +1,130 @@
 #!/usr/bin/env python3
+import atexit
+import json
+import logging
+import selectors
+import struct
 import subprocess
+import threading
 import time
+from collections import Counter
 from datetime import datetime
 import csv
 import os
 import re
-from PIL import Image
-import pytesseract
+from PIL import Image, ImageOps
+from tesserocr import PyTessBaseAPI, PSM, RIL
+
+# 小图上 OpenMP 线程的开销大于收益，单线程跑
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+# 逐行调试输出走 logging，默认 WARNING 不刷屏（LOGLEVEL=DEBUG 打开）
+logging.basicConfig(level=os.environ.get('LOGLEVEL', 'WARNING'))
+log = logging.getLogger(__name__)
+
+# 常驻 Tesseract 实例：避免每帧 fork tesseract 子进程并重新加载 traineddata
+_API = PyTessBaseAPI(lang='eng', psm=PSM.SPARSE_TEXT)
+_API.SetVariable('tessedit_do_invert', '0')  # 输入已二值化，跳过反色重试
+# 只需要号码和英文标签，缩小字符集让 beam search 更快
+_API.SetVariable('tessedit_char_whitelist',
+                 '0123456789+-() '
+                 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+                 'abcdefghijklmnopqrstuvwxyz')
+_API_LOCK = threading.Lock()  # API 不是线程安全的
+atexit.register(_API.End)
+
+# 电话号码的三种格式合成一个 alternation，一次扫描搞定
+_PHONE_RE = re.compile(
+    r'(?P<intl>\+\d[\d\s\-\(\)]{10,})'          # +1 xxx xxx xxxx
+    r'|(?P<paren>\(\d{3}\)\s*\d{3}[\s\-]?\d{4})'  # (xxx) xxx-xxxx
+    r'|(?P<plain>\d{3}[\s\-]?\d{3}[\s\-]?\d{4})'  # xxx-xxx-xxxx
+)
+# 清理号码里的空白和符号：C 层查表，一趟完成，不走正则引擎
+_PHONE_CLEAN = str.maketrans('', '', ' \t\r\n-()')
+
+# 通话界面关键词和 spam 标签各合成一个正则，一趟扫完整段文本
+_CALLSCREEN_RE = re.compile(
+    r'incoming call|calling|answer|decline|reject|accept'
+    r'|end call|mobile|incoming',
+    re.IGNORECASE)
+_LABEL_RE = re.compile(
+    r'(?P<scam>scam likely)|(?P<telemarketing>telemarketing)|(?P<spam>spam)',
+    re.IGNORECASE)
+_LABEL_NAMES = {
+    'scam': 'Scam Likely',
+    'telemarketing': 'Telemarketing',
+    'spam': 'Spam',
+}
+
+# Samsung 拨号器在 logcat 里直接给出号码和 spam 标记，解析这些行
+_MADDRESS_RE = re.compile(r'mAddress:\s*([^,)]+)')
+_MDISPLAY_RE = re.compile(r'mDisplayName:\s*([^,)]+)')
+_SPAM_RE = re.compile(r'mIsSpamOrRisk:\s*(true|false)')
+_RINGING_RE = re.compile(r'RINGING')
+
+# 振铃后多少秒 logcat 还没给出号码才退回截屏 OCR
+OCR_FALLBACK_DELAY = 5
+
+# 一次从 logcat 管道读多少字节（大块读减少系统调用）
+READ_CHUNK = 64 * 1024
+
+# 学习到的号码区域：余量（整屏像素）和连续几次没认出就退回整屏
+BBOX_MARGIN = 40
+BBOX_MAX_MISSES = 3
+
+# 多久强制把 CSV 刷到盘上（秒）
+FSYNC_INTERVAL = 30
+
+
+def _decode_raw(buf):
+    """解析 screencap 裸输出：12/16 字节头 + RGBA 像素，免去两次 zlib"""
+    if len(buf) < 16:
+        return None
+    width, height, _fmt = struct.unpack_from('<III', buf)
+    expected = width * height * 4
+    # Android 8+ 的头是 16 字节（多一个 colorspace 字段），老版本 12 字节
+    offset = 16 if len(buf) - 16 >= expected else 12
+    if len(buf) - offset < expected:
+        return None
+    return Image.frombuffer('RGBA', (width, height),
+                            buf[offset:offset + expected],
+                            'raw', 'RGBA', 0, 1)
+
+
+def _preprocess(img, crop=True):
+    """裁剪上半屏 + 缩小一半 + 二值化，减少 Tesseract 要处理的像素
+
+    crop=False 用于已经裁好的号码区域，只做灰度和二值化。
+    """
+    img = img.convert('L')
+    if crop:
+        img = img.crop((0, 0, img.width, img.height // 2))
+        img = img.resize((img.width // 2, img.height // 2))
+    img = ImageOps.autocontrast(img)
+    return img.point(lambda p: 0 if p < 128 else 255)
 
 class AutoSpamRecorder:
-    def __init__(self, csv_file='spam_calls.csv'):
+    def __init__(self, csv_file='spam_calls.csv', bbox_file='call_bbox.json',
+                 serial=None):
         self.csv_file = csv_file
-        self.screenshot_path = '/tmp/screen.png'
+        self.serial = serial  # 多台设备时用 adb -s 区分
         self.last_number = None
         self.call_detected = False
+        self._ringing_since = None
+        # 学习到的号码区域（整屏坐标），记在 sidecar JSON 里跨次复用
+        self._bbox_file = bbox_file
+        self._call_bbox = self._load_bbox()
+        self._bbox_misses = 0
         self.initialize_csv()
+        # 统计增量维护，show_stats 不用再扫整个 CSV
+        self._label_counts = Counter()
+        self._total = 0
+        self._load_history()
+        # CSV 句柄整个进程只开一次，按时间批量落盘
+        self._csv_fp = open(self.csv_file, 'a', newline='')
+        self._csv_writer = csv.writer(self._csv_fp)
+        self._last_fsync = time.monotonic()
+        atexit.register(self._csv_fp.close)
         
     def initialize_csv(self):
         if not os.path.exists(self.csv_file):
@@ -23,178 +133,295 @@ class AutoSpamRecorder:
                 writer.writerow(['Number', 'Label', 'Date', 'Time'])
             print(f"创建 CSV: {self.csv_file}")
     
+    def _adb(self, *args):
+        """拼 adb 命令，指定了序列号就加 -s"""
+        cmd = ['adb']
+        if self.serial:
+            cmd += ['-s', self.serial]
+        cmd.extend(args)
+        return cmd
+
+    def _load_bbox(self):
+        """读取上次学习到的号码区域"""
+        try:
+            with open(self._bbox_file, 'r') as f:
+                bbox = json.load(f)
+            if isinstance(bbox, list) and len(bbox) == 4:
+                return tuple(bbox)
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def _save_bbox(self):
+        try:
+            with open(self._bbox_file, 'w') as f:
+                json.dump(list(self._call_bbox) if self._call_bbox else None, f)
+        except OSError:
+            pass
+
+    def _learn_bbox(self):
+        """整屏识别成功后，从结果迭代器找号码词的位置并换算回整屏坐标"""
+        boxes = []
+        try:
+            with _API_LOCK:
+                it = _API.GetIterator()
+                if it is None:
+                    return
+                while True:
+                    word = it.GetUTF8Text(RIL.WORD)
+                    if word and _PHONE_RE.search(word):
+                        boxes.append(it.BoundingBox(RIL.WORD))
+                    if not it.Next(RIL.WORD):
+                        break
+        except Exception:
+            return
+
+        boxes = [b for b in boxes if b]
+        if not boxes:
+            return
+
+        left = min(b[0] for b in boxes)
+        top = min(b[1] for b in boxes)
+        right = max(b[2] for b in boxes)
+        bottom = max(b[3] for b in boxes)
+        # 预处理把整屏缩小了一半，乘 2 换算回原图；下方多留些给标签
+        self._call_bbox = (
+            max(0, left * 2 - BBOX_MARGIN),
+            max(0, top * 2 - BBOX_MARGIN),
+            right * 2 + BBOX_MARGIN,
+            bottom * 2 + BBOX_MARGIN * 2,
+        )
+        self._bbox_misses = 0
+        self._save_bbox()
+
+    def _load_history(self):
+        """启动时扫一遍历史记录，之后只做增量计数"""
+        try:
+            with open(self.csv_file, 'r') as f:
+                for row in csv.DictReader(f):
+                    self._label_counts[row['Label']] += 1
+                    self._total += 1
+        except OSError:
+            pass
+
     def take_screenshot(self):
         """截屏"""
         try:
             result = subprocess.run(
-                ['adb', 'exec-out', 'screencap', '-p'],
+                self._adb('exec-out', 'screencap'),
                 capture_output=True,
                 timeout=2
             )
             if result.returncode == 0:
-                with open(self.screenshot_path, 'wb') as f:
-                    f.write(result.stdout)
-                return True
+                # 不带 -p：设备端不压 PNG，直接返回裸 RGBA 字节
+                return result.stdout
         except Exception as e:
             print(f"截屏失败: {e}")
-        return False
+        return None
     
-    def ocr_screen(self):
+    def ocr_screen(self, img, crop=True):
         """OCR 识别屏幕文字"""
         try:
-            img = Image.open(self.screenshot_path)
-            text = pytesseract.image_to_string(img, lang='eng')
-            return text
+            img = _preprocess(img, crop=crop)
+            with _API_LOCK:
+                _API.SetImage(img)
+                return _API.GetUTF8Text()
         except Exception as e:
             print(f"OCR 失败: {e}")
             return ""
     
     def extract_phone_number(self, text):
         """提取电话号码"""
-        # 匹配各种格式
-        patterns = [
-            r'\+\d[\d\s\-\(\)]{10,}',  # +1 xxx xxx xxxx
-            r'\(\d{3}\)\s*\d{3}[\s\-]?\d{4}',  # (xxx) xxx-xxxx
-            r'\d{3}[\s\-]?\d{3}[\s\-]?\d{4}',  # xxx-xxx-xxxx
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text)
-            if match:
-                number = match.group(0)
-                # 清理格式
-                number = re.sub(r'[\s\-\(\)]', '', number)
-                return number
+        match = _PHONE_RE.search(text)
+        if match:
+            # 清理格式
+            return match.group(0).translate(_PHONE_CLEAN)
         return None
     
     def detect_spam_label(self, text):
         """检测 spam 标签"""
-        text_lower = text.lower()
-        
-        # 严格匹配
-        if 'scam likely' in text_lower:
-            return 'Scam Likely'
-        elif 'telemarketing' in text_lower:
-            return 'Telemarketing'
-        elif 'spam' in text_lower:
-            return 'Spam'
-        
-        return 'Regular'
-    
+        match = _LABEL_RE.search(text)
+        return _LABEL_NAMES[match.lastgroup] if match else 'Regular'
+
     def is_call_screen(self, text):
         """判断是否在通话界面"""
-        text_lower = text.lower()
-        keywords = [
-            'incoming call', 'calling', 'answer', 'decline',
-            'reject', 'accept', 'end call', 'mobile', 'incoming'
-        ]
-        return any(keyword in text_lower for keyword in keywords)
+        return bool(_CALLSCREEN_RE.search(text))
     
     def record_call(self, number, label):
         """记录到 CSV"""
         now = datetime.now()
-        
-        with open(self.csv_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                number,
-                label,
-                now.strftime('%Y-%m-%d'),
-                now.strftime('%H:%M:%S')
-            ])
-        
+
+        self._csv_writer.writerow([
+            number,
+            label,
+            now.strftime('%Y-%m-%d'),
+            now.strftime('%H:%M:%S')
+        ])
+        self._label_counts[label] += 1
+        self._total += 1
+
+        # 不是每行都 fsync，按间隔批量落盘
+        now_mono = time.monotonic()
+        if now_mono - self._last_fsync > FSYNC_INTERVAL:
+            self._csv_fp.flush()
+            os.fsync(self._csv_fp.fileno())
+            self._last_fsync = now_mono
+
         print(f"\n{'='*60}")
         print(f"[Record] {now.strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"Number: {number}")
         print(f"Label: {label}")
         print(f"{'='*60}\n")
     
+    def _parse_caller_info(self, line):
+        """从 CallerInfoData 日志行解析号码和标签"""
+        match = _MADDRESS_RE.search(line)
+        number = match.group(1).translate(_PHONE_CLEAN) if match else None
+
+        spam = _SPAM_RE.search(line)
+        if spam and spam.group(1) == 'true':
+            display = _MDISPLAY_RE.search(line)
+            label = display.group(1).strip() if display else 'Spam'
+        else:
+            label = 'Regular'
+
+        return number, label
+
+    def _ocr_fallback(self):
+        """logcat 没给出号码时退回一次截屏 OCR"""
+        buf = self.take_screenshot()
+        if not buf:
+            return
+        img = _decode_raw(buf)
+        if img is None:
+            return
+
+        # 学过号码区域就只 OCR 那一小块，像素量少一个量级
+        used_bbox = self._call_bbox is not None
+        if used_bbox:
+            text = self.ocr_screen(img.crop(self._call_bbox), crop=False)
+        else:
+            text = self.ocr_screen(img)
+        if not text:
+            text = ''
+
+        # 裁剪图上通话界面的关键词多半不在，logcat 的 RINGING 已经把过关
+        if not used_bbox and not self.is_call_screen(text):
+            return
+
+        number = self.extract_phone_number(text)
+        if number:
+            self._bbox_misses = 0
+            if not used_bbox:
+                # 整屏识别成功，顺便学习号码区域供下次裁剪
+                self._learn_bbox()
+            if number != self.last_number:
+                self.record_call(number, self.detect_spam_label(text))
+                self.last_number = number
+        elif used_bbox:
+            # 界面版式可能变了，连续几次没认出就退回整屏
+            self._bbox_misses += 1
+            if self._bbox_misses >= BBOX_MAX_MISSES:
+                self._call_bbox = None
+                self._save_bbox()
+
+    def _handle_logcat_line(self, line):
+        """处理一行 logcat，更新通话状态并记录号码"""
+        log.debug("logcat: %s", line.strip())
+
+        if 'CallerInfoData' in line and 'mIsSpamOrRisk' in line:
+            number, label = self._parse_caller_info(line)
+            if number and number != self.last_number:
+                self.record_call(number, label)
+                self.last_number = number
+                self._ringing_since = None
+        elif _RINGING_RE.search(line):
+            if not self.call_detected:
+                print("[Detect] Found incoming call...")
+                self.call_detected = True
+                self._ringing_since = time.monotonic()
+        elif 'IDLE' in line or 'DISCONNECT' in line:
+            if self.call_detected:
+                print("[Status] Call ended\n")
+            self.call_detected = False
+            self.last_number = None
+            self._ringing_since = None
+
     def start_monitoring(self):
         print("=" * 60)
-        print("OCR Automated monitoring")
+        print("Logcat event monitoring")
         print("=" * 60)
-        print("Take screenshot every 2 seconds")
-        print("Automatically recognize numbers and labels on the screen")
+        print("Listening for CallerInfoData / PHONE_STATE in adb logcat")
+        print("Falls back to screenshot OCR if logcat stays silent")
         print("Press Ctrl+C to stop")
         print("=" * 60)
         print()
-        
-        consecutive_no_call = 0
-        
+
+        # 服务端先过滤，宿主机只收到相关的行
+        process = subprocess.Popen(
+            self._adb('logcat', '-e', 'CallerInfoData|PHONE_STATE',
+                      '-v', 'time'),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        # 非阻塞大块读：整批行一次处理，readline 不会卡住循环
+        os.set_blocking(process.stdout.fileno(), False)
+        sel = selectors.DefaultSelector()
+        sel.register(process.stdout, selectors.EVENT_READ)
+        tail = b''
+        self._ringing_since = None
+        lines_seen = 0
+        last_heartbeat = time.monotonic()
+
         try:
             while True:
-                # 截屏
-                if not self.take_screenshot():
-                    time.sleep(2)
-                    continue
-                
-                # OCR 识别
-                text = self.ocr_screen()
-                
-                if not text:
-                    time.sleep(2)
-                    continue
-                
-                # 调试：打印识别的文本（前200字符）
-                # print(f"[OCR] {text[:200]}")
-                
-                # 检测是否在通话界面
-                if self.is_call_screen(text):
-                    consecutive_no_call = 0
-                    
-                    if not self.call_detected:
-                        print("[Detect] Found incoming call...")
-                        self.call_detected = True
-                    
-                    # 提取号码
-                    number = self.extract_phone_number(text)
-                    
-                    if number and number != self.last_number:
-                        # 检测标签
-                        label = self.detect_spam_label(text)
-                        
-                        # 记录
-                        self.record_call(number, label)
-                        self.last_number = number
-                else:
-                    consecutive_no_call += 1
-                    
-                    # 如果三次没有检测到通话，重置状态
-                    if consecutive_no_call >= 3:
-                        if self.call_detected:
-                            print("[Status] Call ended\n")
-                        self.call_detected = False
-                        self.last_number = None
-                
-                time.sleep(2)  # 每 2 秒检查一次
-                
+                # 空闲时睡在 selector 里，不烧 CPU
+                if sel.select(timeout=1.0):
+                    chunk = process.stdout.read(READ_CHUNK)
+                    if chunk == b'':
+                        print("[Status] logcat ended")
+                        break
+                    if chunk:
+                        lines = (tail + chunk).split(b'\n')
+                        tail = lines.pop()  # 不完整的行留到下一块
+                        for raw in lines:
+                            self._handle_logcat_line(
+                                raw.decode('utf-8', 'replace'))
+                        lines_seen += len(lines)
+
+                # 心跳按时间触发，不按行数，高峰期不额外花功夫
+                now = time.monotonic()
+                if now - last_heartbeat > 10:
+                    log.info("heartbeat: %d logcat lines processed",
+                             lines_seen)
+                    last_heartbeat = now
+
+                # OCR 兜底：振铃后 logcat 一直没给出号码
+                if (self._ringing_since is not None
+                        and time.monotonic() - self._ringing_since
+                        > OCR_FALLBACK_DELAY):
+                    self._ringing_since = None
+                    self._ocr_fallback()
+
         except KeyboardInterrupt:
             print("\n\nMonitoring stopped")
             print(f"Data saved to: {self.csv_file}")
             self.show_stats()
+        finally:
+            sel.close()
+            process.terminate()
     
     def show_stats(self):
         """显示统计"""
-        try:
-            with open(self.csv_file, 'r') as f:
-                lines = list(csv.DictReader(f))
-                
-            if not lines:
-                print("No records")
-                return
-            
-            total = len(lines)
-            regular = sum(1 for l in lines if l['Label'] == 'Regular')
-            telemarketing = sum(1 for l in lines if l['Label'] == 'Telemarketing')
-            scam = sum(1 for l in lines if l['Label'] == 'Scam Likely')
-            
-            print(f"\nStatistics:")
-            print(f"  Total: {total}")
-            print(f"  Regular: {regular}")
-            print(f"  Telemarketing: {telemarketing}")
-            print(f"  Scam Likely: {scam}")
-        except:
-            pass
+        if not self._total:
+            print("No records")
+            return
+
+        print(f"\nStatistics:")
+        print(f"  Total: {self._total}")
+        print(f"  Regular: {self._label_counts['Regular']}")
+        print(f"  Telemarketing: {self._label_counts['Telemarketing']}")
+        print(f"  Scam Likely: {self._label_counts['Scam Likely']}")
 
 if __name__ == '__main__':
     recorder = AutoSpamRecorder()
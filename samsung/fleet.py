@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""多台手机并行监控：每台设备一个常驻 worker 进程，CSV 各写各的"""
+import multiprocessing
+import os
+import sys
+
+
+def _init_worker():
+    # 每个 worker 各自持有一份常驻 Tesseract；小图 4 个 OpenMP 线程够用
+    os.environ.setdefault('OMP_THREAD_LIMIT', '4')
+
+
+def _run_device(serial):
+    # 在 worker 里才 import，常驻 Tesseract 实例在各进程内初始化一次
+    from auto_spam_recorder import AutoSpamRecorder
+
+    recorder = AutoSpamRecorder(
+        csv_file=f'spam_calls_{serial}.csv',
+        bbox_file=f'call_bbox_{serial}.json',
+        serial=serial,
+    )
+    recorder.start_monitoring()
+
+
+class Fleet:
+    """给每台设备开一个 worker，各自消费 adb -s <serial> 的数据流
+
+    每台设备写自己的 CSV，避免跨进程抢同一个文件，事后离线合并。
+    """
+
+    def __init__(self, serials):
+        self.serials = list(serials)
+
+    def run(self):
+        print(f"启动 {len(self.serials)} 台设备的监控: {self.serials}")
+        pool = multiprocessing.Pool(len(self.serials),
+                                    initializer=_init_worker)
+        try:
+            pool.map(_run_device, self.serials)
+        except KeyboardInterrupt:
+            print("\n\n监控停止")
+            pool.terminate()
+        finally:
+            pool.join()
+
+
+if __name__ == '__main__':
+    serials = sys.argv[1:]
+    if not serials:
+        print("用法: python fleet.py <serial> [serial ...]")
+        print("序列号用 'adb devices' 查看")
+        sys.exit(1)
+    Fleet(serials).run()
@@ -7,19 +7,91 @@ import os
 import re
 
 try:
-    from PIL import Image
-    import pytesseract
+    from PIL import Image, ImageOps
+    from tesserocr import PyTessBaseAPI, PSM
 except ImportError:
     print("需要安装依赖:")
-    print("pip install pillow pytesseract")
+    print("pip install pillow tesserocr")
     print("brew install tesseract  # macOS")
     exit(1)
 
+import atexit
+import hashlib
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 小图上 OpenMP 线程的开销大于收益，单线程跑
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+# 常驻 Tesseract 实例：避免每帧 fork tesseract 子进程并重新加载 traineddata
+_API = PyTessBaseAPI(lang='eng', psm=PSM.SPARSE_TEXT)
+_API.SetVariable('tessedit_do_invert', '0')  # 输入已二值化，跳过反色重试
+# 只需要号码和英文标签，缩小字符集让 beam search 更快
+_API.SetVariable('tessedit_char_whitelist',
+                 '0123456789+-() '
+                 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+                 'abcdefghijklmnopqrstuvwxyz')
+_API_LOCK = threading.Lock()  # API 不是线程安全的
+atexit.register(_API.End)
+
+# 电话号码，导入时编译好
+_PHONE_RE = re.compile(r'[\+\d][\d\s\-\(\)]{9,}')
+
+# 通话界面关键词和 spam 标签各合成一个正则，一趟扫完整段文本
+_CALL_GATE_RE = re.compile(r'calling|incoming|call|来电|通话', re.IGNORECASE)
+_LABEL_RE = re.compile(
+    r'(?P<scam>scam( likely)?)|(?P<telemarketing>telemarket(ing)?)'
+    r'|(?P<spam>spam)',
+    re.IGNORECASE)
+_LABEL_NAMES = {
+    'scam': 'Scam Likely',
+    'telemarketing': 'Telemarketing',
+    'spam': 'Spam',
+}
+
+# 多久强制把 CSV 刷到盘上（秒）
+FSYNC_INTERVAL = 30
+
+# 轮询节奏：正常每秒一帧，长时间空闲后放慢
+PERIOD = 1.0
+IDLE_PERIOD = 5.0
+IDLE_AFTER = 10  # 连续多少个无通话节拍后退到 IDLE_PERIOD
+
+
+def _decode_raw(buf):
+    """解析 screencap 裸输出：12/16 字节头 + RGBA 像素，免去两次 zlib"""
+    if len(buf) < 16:
+        return None
+    width, height, _fmt = struct.unpack_from('<III', buf)
+    expected = width * height * 4
+    # Android 8+ 的头是 16 字节（多一个 colorspace 字段），老版本 12 字节
+    offset = 16 if len(buf) - 16 >= expected else 12
+    if len(buf) - offset < expected:
+        return None
+    return Image.frombuffer('RGBA', (width, height),
+                            buf[offset:offset + expected],
+                            'raw', 'RGBA', 0, 1)
+
+
+def _preprocess(img):
+    """裁剪上半屏 + 缩小一半 + 二值化，减少 Tesseract 要处理的像素"""
+    img = img.convert('L')
+    img = img.crop((0, 0, img.width, img.height // 2))
+    img = img.resize((img.width // 2, img.height // 2))
+    img = ImageOps.autocontrast(img)
+    return img.point(lambda p: 0 if p < 128 else 255)
+
 class ScreenMonitor:
     def __init__(self, csv_file='spam_calls_record.csv'):
         self.csv_file = csv_file
-        self.screenshot_file = '/tmp/screen.png'
+        self._last_hash = None
         self.initialize_csv()
+        # CSV 句柄整个进程只开一次，按时间批量落盘
+        self._csv_fp = open(self.csv_file, 'a', newline='')
+        self._csv_writer = csv.writer(self._csv_fp)
+        self._last_fsync = time.monotonic()
+        atexit.register(self._csv_fp.close)
         
     def initialize_csv(self):
         if not os.path.exists(self.csv_file):
@@ -29,43 +101,35 @@ class ScreenMonitor:
             print(f"创建 CSV: {self.csv_file}")
     
     def take_screenshot(self):
-        """截屏"""
-        subprocess.run(['adb', 'exec-out', 'screencap', '-p'], 
-                      stdout=open(self.screenshot_file, 'wb'), 
-                      stderr=subprocess.DEVNULL)
-    
-    def extract_text_from_screen(self):
+        """截屏，裸 RGBA 字节留在内存里（不带 -p，跳过 PNG 压缩）"""
+        result = subprocess.run(['adb', 'exec-out', 'screencap'],
+                               capture_output=True)
+        return result.stdout if result.returncode == 0 else None
+
+    def extract_text_from_screen(self, img):
         """OCR 识别屏幕文字"""
         try:
-            img = Image.open(self.screenshot_file)
-            text = pytesseract.image_to_string(img)
-            return text
+            img = _preprocess(img)
+            with _API_LOCK:
+                _API.SetImage(img)
+                return _API.GetUTF8Text()
         except Exception as e:
             return ""
     
     def detect_call_and_label(self, text):
         """检测是否在通话中，以及标签"""
-        text_lower = text.lower()
-        
         # 检测是否在通话界面
-        if not any(word in text_lower for word in 
-                   ['calling', 'incoming', 'call', '来电', '通话']):
+        if not _CALL_GATE_RE.search(text):
             return None, None
-        
+
         # 提取电话号码
-        phone_match = re.search(r'[\+\d][\d\s\-\(\)]{9,}', text)
+        phone_match = _PHONE_RE.search(text)
         phone = phone_match.group(0).strip() if phone_match else None
-        
+
         # 检测标签
-        if 'scam likely' in text_lower or 'scam' in text_lower:
-            label = 'Scam Likely'
-        elif 'telemarketing' in text_lower or 'telemarket' in text_lower:
-            label = 'Telemarketing'
-        elif 'spam' in text_lower:
-            label = 'Spam'
-        else:
-            label = 'Regular'
-        
+        match = _LABEL_RE.search(text)
+        label = _LABEL_NAMES[match.lastgroup] if match else 'Regular'
+
         return phone, label
     
     def record_call(self, number, label):
@@ -74,10 +138,15 @@ class ScreenMonitor:
         date = now.strftime('%Y-%m-%d')
         time_str = now.strftime('%H:%M:%S')
         
-        with open(self.csv_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([number, label, date, time_str])
-        
+        self._csv_writer.writerow([number, label, date, time_str])
+
+        # 不是每行都 fsync，按间隔批量落盘
+        now_mono = time.monotonic()
+        if now_mono - self._last_fsync > FSYNC_INTERVAL:
+            self._csv_fp.flush()
+            os.fsync(self._csv_fp.fileno())
+            self._last_fsync = now_mono
+
         print(f"\n记录: {number} - {label} ({date} {time_str})")
     
     def start_monitoring(self):
@@ -88,24 +157,57 @@ class ScreenMonitor:
         print("=" * 60)
         
         recorded = set()
-        
+
+        # 两级流水线：OCR 当前帧的同时，后台线程抓下一帧，
+        # 整体节奏变成 max(截屏, OCR) 而不是两者之和
+        pool = ThreadPoolExecutor(max_workers=1)
+        future = pool.submit(self.take_screenshot)
+
+        period = PERIOD
+        idle_ticks = 0
+        next_tick = time.monotonic()
+
         try:
             while True:
-                self.take_screenshot()
-                text = self.extract_text_from_screen()
-                
-                if text:
-                    phone, label = self.detect_call_and_label(text)
-                    
-                    if phone and phone not in recorded:
-                        print(f"检测到通话: {phone} - {label}")
-                        self.record_call(phone, label)
-                        recorded.add(phone)
-                
-                time.sleep(1)  # 每秒检查一次
-                
+                # 对齐到下一个节拍，节奏不随处理耗时漂移
+                time.sleep(max(0.0, next_tick - time.monotonic()))
+                next_tick = time.monotonic() + period
+
+                phone = None
+                buf = future.result()
+                future = pool.submit(self.take_screenshot)
+
+                if buf:
+                    img = _decode_raw(buf)
+                    # 画面没变就跳过 OCR
+                    if img is not None:
+                        thumb = img.resize((32, 32),
+                                           Image.NEAREST).convert('L')
+                        frame_hash = hashlib.blake2b(
+                            thumb.tobytes(), digest_size=8).digest()
+                        if frame_hash != self._last_hash:
+                            self._last_hash = frame_hash
+                            text = self.extract_text_from_screen(img)
+                            if text:
+                                phone, label = self.detect_call_and_label(text)
+                                if phone and phone not in recorded:
+                                    print(f"检测到通话: {phone} - {label}")
+                                    self.record_call(phone, label)
+                                    recorded.add(phone)
+
+                # 长时间没检测到通话就放慢轮询节奏
+                if phone:
+                    idle_ticks = 0
+                    period = PERIOD
+                else:
+                    idle_ticks += 1
+                    if idle_ticks > IDLE_AFTER:
+                        period = IDLE_PERIOD
+
         except KeyboardInterrupt:
             print("\n\n监控停止")
+        finally:
+            pool.shutdown(wait=False)
 
 if __name__ == '__main__':
     monitor = ScreenMonitor()